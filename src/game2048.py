@@ -1,5 +1,292 @@
-import random
-import copy
+import numpy as np
+from numba import njit, types
+
+# The board is packed into a single 64-bit integer. Cell (r, c) occupies the
+# nibble at bits 4*(4*r + c) .. 4*(4*r + c) + 3 and holds the log2 exponent of
+# the tile (0 for an empty cell), so each row is a 16-bit value with column 0
+# in its lowest nibble.
+BOARD_SIZE = 4
+MAX_POWER = 16  # distinct exponents a nibble can hold
+ROW_MASK = 0xFFFF
+NIBBLE_MASK = 0xF
+
+# The board kernels below are compiled with numba for uint64 boards. Their
+# masks are uint64 constants, since mixing uint64 with plain int literals
+# in numba yields signed int64.
+_BOARD = types.uint64
+_MOVE_RESULT = types.Tuple((types.uint64, types.int64))
+_ROW_MASK_U64 = np.uint64(ROW_MASK)
+# One flag bit per cell. The adjacency masks keep only pairs of horizontal
+# neighbours within a row and vertical neighbours within the board.
+EMPTY_MASK = np.uint64(0x1111111111111111)
+H_ADJ_MASK = np.uint64(0x0111011101110111)
+V_ADJ_MASK = np.uint64(0x0000111111111111)
+_LOW_NIBBLES = np.uint64(0x0F0F0F0F0F0F0F0F)
+_BYTE_FLAGS = np.uint64(0x1010101010101010)
+
+
+def _build_row_tables():
+    """
+    Precomputes the result of merging every possible 16-bit row to the left.
+
+    Works on the exponents directly: two equal neighbours combine into one
+    tile with the next exponent, and each cell may only merge once per move.
+    A pair of 32768 tiles is left alone since 65536 does not fit in a nibble.
+    """
+    merged_rows = np.zeros(ROW_MASK + 1, dtype=np.uint64)
+    score_deltas = np.zeros(ROW_MASK + 1, dtype=np.int64)
+    for row in range(ROW_MASK + 1):
+        powers = [(row >> (4 * i)) & NIBBLE_MASK for i in range(BOARD_SIZE)]
+        powers = [power for power in powers if power != 0]
+        merged = []
+        score_increase = 0
+        i = 0
+        while i < len(powers):
+            if i + 1 < len(powers) and powers[i] == powers[i+1] and powers[i] < 15:
+                merged.append(powers[i] + 1)
+                score_increase += 1 << (powers[i] + 1)
+                i += 2
+            else:
+                merged.append(powers[i])
+                i += 1
+
+        new_row = 0
+        for i, power in enumerate(merged):
+            new_row |= power << (4 * i)
+        merged_rows[row] = new_row
+        score_deltas[row] = score_increase
+    return merged_rows, score_deltas
+
+
+# MERGED_ROW[row] / SCORE_DELTA[row]: the row after moving it left and the
+# points scored by the merges.
+MERGED_ROW, SCORE_DELTA = _build_row_tables()
+
+
+def _build_right_tables():
+    """
+    Derives the move-right tables from the move-left ones: moving a row right
+    is moving its mirror image left and mirroring the result back.
+    """
+    def mirror(rows):
+        return (((rows & np.uint64(0xF000)) >> np.uint64(12)) |
+                ((rows & np.uint64(0x0F00)) >> np.uint64(4)) |
+                ((rows & np.uint64(0x00F0)) << np.uint64(4)) |
+                ((rows & np.uint64(0x000F)) << np.uint64(12)))
+
+    mirrored = mirror(np.arange(ROW_MASK + 1, dtype=np.uint64))
+    return mirror(MERGED_ROW[mirrored]), SCORE_DELTA[mirrored]
+
+
+# The same tables for moving a row to the right
+MERGED_ROW_RIGHT, SCORE_DELTA_RIGHT = _build_right_tables()
+
+
+@njit(_BOARD(_BOARD), cache=True)
+def transpose(board):
+    """Transposes the packed board by swapping nibbles across the diagonal."""
+    a1 = board & np.uint64(0xF0F00F0FF0F00F0F)
+    a2 = board & np.uint64(0x0000F0F00000F0F0)
+    a3 = board & np.uint64(0x0F0F00000F0F0000)
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & np.uint64(0xFF00FF0000FF00FF)
+    b2 = a & np.uint64(0x00FF00FF00000000)
+    b3 = a & np.uint64(0x00000000FF00FF00)
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+@njit(cache=True)
+def _merge_rows(board, merged_rows, score_deltas):
+    """Looks up every row of the packed board in a pair of row tables."""
+    row0 = board & _ROW_MASK_U64
+    row1 = (board >> 16) & _ROW_MASK_U64
+    row2 = (board >> 32) & _ROW_MASK_U64
+    row3 = board >> 48
+    new_board = (merged_rows[row0] | (merged_rows[row1] << 16) |
+                 (merged_rows[row2] << 32) | (merged_rows[row3] << 48))
+    score_increase = score_deltas[row0] + score_deltas[row1] + score_deltas[row2] + score_deltas[row3]
+    return new_board, score_increase
+
+
+@njit(_MOVE_RESULT(_BOARD), cache=True)
+def move_left(board):
+    """
+    Slides and merges every row of the packed board to the left.
+    Returns the new board and the points scored.
+    """
+    return _merge_rows(board, MERGED_ROW, SCORE_DELTA)
+
+
+@njit(_MOVE_RESULT(_BOARD), cache=True)
+def move_right(board):
+    """Slides and merges the packed board to the right."""
+    return _merge_rows(board, MERGED_ROW_RIGHT, SCORE_DELTA_RIGHT)
+
+
+@njit(_MOVE_RESULT(_BOARD), cache=True)
+def move_up(board):
+    """Slides and merges the packed board upwards."""
+    new_board, score_increase = move_left(transpose(board))
+    return transpose(new_board), score_increase
+
+
+@njit(_MOVE_RESULT(_BOARD), cache=True)
+def move_down(board):
+    """Slides and merges the packed board downwards (columns moved right)."""
+    new_board, score_increase = move_right(transpose(board))
+    return transpose(new_board), score_increase
+
+
+# Directions in the order used by the integer-indexed move_board
+DIRECTIONS = ("up", "down", "left", "right")
+MOVES = {"up": move_up, "down": move_down, "left": move_left, "right": move_right}
+
+
+@njit(_MOVE_RESULT(_BOARD, types.int64), cache=True)
+def move_board(board, direction):
+    """Applies the move DIRECTIONS[direction] to a packed board."""
+    if direction == 0:
+        return move_up(board)
+    if direction == 1:
+        return move_down(board)
+    if direction == 2:
+        return move_left(board)
+    return move_right(board)
+
+
+def simulate_move(board, direction):
+    """
+    Applies a move to a packed board without spawning a tile.
+    Returns (new_board, score_increase, changed).
+    """
+    new_board, score_increase = MOVES[direction](board)
+    return new_board, score_increase, new_board != board
+
+
+@njit(_BOARD(_BOARD), cache=True)
+def _zero_nibbles(x):
+    """Returns a mask with the low bit of every zero nibble of x set."""
+    return ~(x | (x >> 1) | (x >> 2) | (x >> 3)) & EMPTY_MASK
+
+
+@njit(_BOARD(_BOARD), cache=True)
+def _full_nibbles(x):
+    """Returns a mask with the low bit of every 0xF nibble of x set."""
+    return x & (x >> 1) & (x >> 2) & (x >> 3) & EMPTY_MASK
+
+
+@njit(types.int64(_BOARD), cache=True)
+def _empty_cell_bits(board):
+    """Returns a 16-bit mask with bit i set if cell i of the board is empty."""
+    x = _zero_nibbles(board)
+    # Gather the low bit of every nibble into one contiguous 16-bit value
+    x = (x | (x >> 3)) & np.uint64(0x0303030303030303)
+    x = (x | (x >> 6)) & np.uint64(0x000F000F000F000F)
+    x = (x | (x >> 12)) & np.uint64(0x000000FF000000FF)
+    x = (x | (x >> 24)) & _ROW_MASK_U64
+    return np.int64(x)
+
+
+def _build_select_table():
+    """
+    Precomputes the position of the k-th lowest set bit of every 16-bit
+    mask, stored at index (mask << 4) | k.
+    """
+    masks = np.arange(ROW_MASK + 1)
+    positions = np.arange(16)
+    bits = (masks[:, None] >> positions) & 1
+    ranks = np.cumsum(bits, axis=1) - 1
+    table = np.zeros((ROW_MASK + 1, 16), dtype=np.uint8)
+    rows, cols = np.nonzero(bits)
+    table[rows, ranks[rows, cols]] = cols
+    # bytes index to a plain int, which is cheaper than a numpy scalar
+    return table.tobytes()
+
+
+SELECT_CELL = _build_select_table()
+
+
+@njit(types.int64(_BOARD), cache=True)
+def count_empty(board):
+    """Counts the empty cells of a packed board."""
+    empty_cells = _zero_nibbles(board)
+    count = 0
+    while empty_cells:
+        empty_cells &= empty_cells - np.uint64(1)
+        count += 1
+    return count
+
+
+@njit(_BOARD(_BOARD, _BOARD), cache=True)
+def _nibble_max(x, y):
+    """Returns the lane-wise maximum of the nibbles of x and y."""
+    result = np.uint64(0)
+    for shift in (0, 4):
+        # Spread every other nibble into its own byte so that a per-byte
+        # subtraction cannot borrow from its neighbour.
+        a = (x >> shift) & _LOW_NIBBLES
+        b = (y >> shift) & _LOW_NIBBLES
+        # Bit 4 of a byte survives the subtraction iff a >= b in that byte
+        a_ge_b = ((a | _BYTE_FLAGS) - b) & _BYTE_FLAGS
+        mask = (a_ge_b >> 4) * np.uint64(0xF)
+        result |= ((a & mask) | (b & ~mask & _LOW_NIBBLES)) << shift
+    return result
+
+
+@njit(types.int64(_BOARD), cache=True)
+def max_exponent(board):
+    """Returns the largest tile exponent on the packed board."""
+    # Fold the 16 nibbles in half until a single one is left
+    m = _nibble_max(board, board >> 32)
+    m = _nibble_max(m, m >> 16)
+    m = _nibble_max(m, m >> 8)
+    m = _nibble_max(m, m >> 4)
+    return np.int64(m & np.uint64(0xF))
+
+
+@njit(types.boolean(_BOARD), cache=True)
+def has_valid_moves(board):
+    """  bool: True if a move is possible on the packed board, False otherwise."""
+    # XOR-ing the board with itself shifted by one cell leaves a zero nibble
+    # wherever two neighbours match. Pairs of 32768 tiles don't merge (see
+    # _build_row_tables), so those matches are dropped.
+    mergeable = ~_full_nibbles(board)
+    return bool(
+        _zero_nibbles(board)
+        or _zero_nibbles(board ^ (board >> 4)) & H_ADJ_MASK & mergeable
+        or _zero_nibbles(board ^ (board >> 16)) & V_ADJ_MASK & mergeable
+    )
+
+
+class TilePool:
+    """
+    Supplies the random numbers for tile spawns. They are generated by a
+    seedable numpy Generator in large batches, which amortises the cost of
+    calling into the random module twice per spawn.
+    """
+    def __init__(self, size=100000, seed=None):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self._refill()
+
+    def _refill(self):
+        """Generates the next batch of draws."""
+        # Plain lists index faster from Python than numpy arrays
+        self.cell_draws = self.rng.random(self.size).tolist()
+        self.two_draws = (self.rng.random(self.size) < 0.9).tolist()
+        self.index = 0
+
+    def draw(self):
+        """
+        Returns (u, is_two): u is uniform in [0, 1) and picks the empty cell,
+        is_two is True 90% of the time.
+        """
+        if self.index == self.size:
+            self._refill()
+        i = self.index
+        self.index += 1
+        return self.cell_draws[i], self.two_draws[i]
+
 
 class Game2048:
     """
@@ -7,55 +294,35 @@ class Game2048:
     It handles the game board, player moves (up, down, left, right),
     tile merging, scoring, and game state.
     """
-    def __init__(self, board_size=4):
+    def __init__(self, board_size=BOARD_SIZE, tile_pool=None):
+        if board_size != BOARD_SIZE:
+            raise ValueError("The packed board only supports a 4x4 grid.")
         self.board_size = board_size
-        self.board = [[0 for _ in range(self.board_size)] for _ in range(self.board_size)]
+        self.tile_pool = tile_pool if tile_pool is not None else TilePool()
+        self.board = 0
         self.score = 0
         self.game_over = False
         self.add_random_tile()
         self.add_random_tile()
 
+    def get_tile(self, row, col):
+        """Returns the tile value at the given cell (0 if empty)."""
+        power = (self.board >> (4 * (BOARD_SIZE * row + col))) & NIBBLE_MASK
+        return 1 << power if power else 0
+
     def add_random_tile(self):
         """
         Adds a new tile (either 2 or 4) to a random empty cell on the board.
         '2' is added 90% of the time, and '4' is added 10% of the time.
         """
-        empty_cells = []
-        for i in range(self.board_size):
-            for j in range(self.board_size):
-                if self.board[i][j] == 0:
-                    empty_cells.append((i, j))
-        
-        if empty_cells:
-            i, j = random.choice(empty_cells)
-            self.board[i][j] = 2 if random.random() < 0.9 else 4
+        # Bit i is set if cell i is empty
+        empty_cells = _empty_cell_bits(self.board)
 
-    def merge_row_left(self, row):
-        """
-        Merges a single row to the left.
-        """
-        new_row = [i for i in row if i != 0]
-        score_increase = 0
-        i = 0
-        while i < len(new_row) - 1:
-            if new_row[i] == new_row[i+1]:
-                merged_val = new_row[i] * 2
-                new_row[i] = merged_val
-                score_increase += merged_val
-                new_row.pop(i + 1)
-            i += 1
-
-        #Fill rest of row with zeros
-        new_row.extend([0] * (self.board_size - len(new_row)))
-        return new_row, score_increase
-
-    def transpose(self, board):
-        """Transposes the game board."""
-        return [list(row) for row in zip(*board)]
-
-    def reverse(self, board):
-        """Reverses each row of the game board."""
-        return [row[::-1] for row in board]
+        if empty_cells:
+            u, is_two = self.tile_pool.draw()
+            # Look up the cell holding the k-th lowest empty bit
+            cell = SELECT_CELL[empty_cells << 4 | int(u * empty_cells.bit_count())]
+            self.board |= (1 if is_two else 2) << (4 * cell)
 
     def make_move(self, direction):
         """
@@ -64,75 +331,28 @@ class Game2048:
         if self.game_over:
             return False
 
-        original_board = copy.deepcopy(self.board)
-        original_score = self.score
-
-        if direction == "left":
-            new_board = []
-            for i in range(self.board_size):
-                new_row, score_increase = self.merge_row_left(self.board[i])
-                self.score += score_increase
-                new_board.append(new_row)
-            self.board = new_board
-
-        elif direction == "right":
-            reversed_board = self.reverse(self.board)
-            new_board = []
-            for i in range(self.board_size):
-                new_row, score_increase = self.merge_row_left(reversed_board[i])
-                self.score += score_increase
-                new_board.append(new_row)
-            self.board = self.reverse(new_board)
-
-        elif direction == "up":
-            transposed_board = self.transpose(self.board)
-            new_board = []
-            for i in range(self.board_size):
-                new_row, score_increase = self.merge_row_left(transposed_board[i])
-                self.score += score_increase
-                new_board.append(new_row)
-            self.board = self.transpose(new_board)
-
-        elif direction == "down":
-            transposed_board = self.transpose(self.board)
-            reversed_board = self.reverse(transposed_board)
-            new_board = []
-            for i in range(self.board_size):
-                new_row, score_increase = self.merge_row_left(reversed_board[i])
-                self.score += score_increase
-                new_board.append(new_row)
-            self.board = self.transpose(self.reverse(new_board))
-
-        board_changed = original_board != self.board
-        if board_changed:
-            self.add_random_tile()
+        new_board, score_increase, changed = simulate_move(self.board, direction)
+        if not changed:
+            # Nothing moved, so the board, score and game state are unchanged
+            return False
+
+        self.board = new_board
+        self.score += score_increase
+        self.add_random_tile()
 
         if not self.has_valid_moves():
             self.game_over = True
-            
-        return board_changed
+
+        return True
 
     def has_valid_moves(self):
         """  bool: True if a move is possible, False otherwise."""
-        # Check for empty cells
-        if any(0 in row for row in self.board):
-            return True
-
-        # Check for adjacent identical tiles (horizontally and vertically)
-        for i in range(self.board_size):
-            for j in range(self.board_size):
-                if j < self.board_size - 1 and self.board[i][j] == self.board[i][j+1]:
-                    return True
-                if i < self.board_size - 1 and self.board[i][j] == self.board[i+1][j]:
-                    return True
-        
-        return False
+        return has_valid_moves(self.board)
 
     def reset(self):
         """Resets the game to its initial state."""
-        self.board = [[0 for _ in range(self.board_size)] for _ in range(self.board_size)]
+        self.board = 0
         self.score = 0
         self.game_over = False
         self.add_random_tile()
         self.add_random_tile()
-
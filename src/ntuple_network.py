@@ -1,17 +1,118 @@
-import math
-import copy
-from game2048 import Game2048
+import pickle
+
+import numpy as np
+from numba import njit
+
+from game2048 import (BOARD_SIZE, DIRECTIONS, MAX_POWER, Game2048, count_empty,
+                      max_exponent, move_board, transpose)
+
+# Every tuple covers four cells, so a pattern is four base-16 digits
+TUPLE_LEN = 4
+_NIBBLE = np.uint64(0xF)
+_ROW = np.uint64(0xFFFF)
+
+
+def _build_monotone_table():
+    """
+    Flags every 16-bit row whose non-zero tiles (at least two of them) are in
+    increasing or decreasing order. Exponents preserve the ordering of the
+    tile values, so they can be compared directly.
+    """
+    rows = np.arange(1 << 16)
+    powers = (rows[:, None] >> (4 * np.arange(BOARD_SIZE))) & 0xF
+    occupied = powers > 0
+    is_increasing = np.ones(len(rows), dtype=bool)
+    is_decreasing = np.ones(len(rows), dtype=bool)
+    for i in range(BOARD_SIZE):
+        for j in range(i + 1, BOARD_SIZE):
+            both = occupied[:, i] & occupied[:, j]
+            is_increasing &= ~both | (powers[:, i] <= powers[:, j])
+            is_decreasing &= ~both | (powers[:, i] >= powers[:, j])
+    return ((occupied.sum(axis=1) > 1) & (is_increasing | is_decreasing)).astype(np.uint8)
+
+
+ROW_MONOTONE = _build_monotone_table()
+
+
+@njit(cache=True)
+def pattern_index(board, shifts):
+    """
+    Computes the pattern index of one 4-tuple: the exponents of its cells
+    as base-16 digits, i.e. nibbles of the index.
+    """
+    return np.int64(((board >> shifts[0]) & _NIBBLE) |
+                    (((board >> shifts[1]) & _NIBBLE) << 4) |
+                    (((board >> shifts[2]) & _NIBBLE) << 8) |
+                    (((board >> shifts[3]) & _NIBBLE) << 12))
+
+
+@njit(cache=True)
+def evaluate_packed(board, shifts, table_ids, weights):
+    """Compiled body of NTupleNetwork.evaluate for a packed board."""
+    total_value = 0.0
+
+    # 1. N-tuple learned weights (every feature reads its tuple's table)
+    for k in range(shifts.shape[0]):
+        total_value += weights[table_ids[k], pattern_index(board, shifts[k])]
+
+    # 2. Empty cells are valuable
+    total_value += count_empty(board) * 50
+
+    # 3. Monotonicity (encourages ordered rows/columns). The rows of the
+    # transposed board are the columns.
+    columns = transpose(board)
+    monotone_lines = (ROW_MONOTONE[board & _ROW] + ROW_MONOTONE[(board >> 16) & _ROW] +
+                      ROW_MONOTONE[(board >> 32) & _ROW] + ROW_MONOTONE[board >> 48] +
+                      ROW_MONOTONE[columns & _ROW] + ROW_MONOTONE[(columns >> 16) & _ROW] +
+                      ROW_MONOTONE[(columns >> 32) & _ROW] + ROW_MONOTONE[columns >> 48])
+    total_value += monotone_lines * 50
+
+    # 4. High tiles in corners are good
+    highest_power = max_exponent(board)
+    if highest_power >= 6:
+        corner_power = np.uint64(highest_power)
+        if (board & _NIBBLE == corner_power or
+                (board >> 12) & _NIBBLE == corner_power or
+                (board >> 48) & _NIBBLE == corner_power or
+                board >> 60 == corner_power):
+            total_value += 1 << highest_power
+
+    return total_value
+
+
+@njit(cache=True)
+def _evaluate_batch(boards, shifts, table_ids, weights):
+    """Evaluates every packed board in `boards` in a single compiled call."""
+    values = np.empty(boards.shape[0])
+    for k in range(boards.shape[0]):
+        values[k] = evaluate_packed(boards[k], shifts, table_ids, weights)
+    return values
+
 
 class NTupleNetwork:
     """
     The network uses a set of patterns (N-tuples) on the
     board. It calculates a score based on the weights associated with
     the patterns, along with some evaluations.
+
+    With symmetric=True only canonical tuple shapes get weight tables, and
+    each one is read through all 8 symmetries of the board (symmetric
+    sampling), so every update trains all 8 views of a pattern.
     """
-    def __init__(self, board_size=4, max_tile_power=16):
+    def __init__(self, board_size=BOARD_SIZE, max_tile_power=MAX_POWER, symmetric=False):
+        if board_size != BOARD_SIZE or max_tile_power != MAX_POWER:
+            raise ValueError("The network is specialised for a 4x4 board with 16 tile powers.")
         self.board_size = board_size
         self.max_power = max_tile_power
+        self._set_layout(symmetric)
+
+    def _set_layout(self, symmetric):
+        """Builds the tuples, feature arrays and empty weights for a layout."""
+        self.symmetric = symmetric
         self.tuples = self._create_tuples()
+        self.shifts, self.table_ids = self._flatten_tuples()
+        # Number of features reading each weight table
+        self.num_views = len(self.shifts) // len(self.tuples)
         self.weights = self._initialize_weights()
 
     def _create_tuples(self):
@@ -20,6 +121,15 @@ class NTupleNetwork:
         Creates a list of tuples that represent patterns on the board.
         """
         tuples = []
+        if self.symmetric:
+            # Canonical shapes; the symmetries cover the remaining lines/squares
+            tuples.append([(0, j) for j in range(self.board_size)])  # outer lines
+            tuples.append([(1, j) for j in range(self.board_size)])  # inner lines
+            tuples.append([(0, 0), (0, 1), (1, 0), (1, 1)])          # corner squares
+            tuples.append([(0, 1), (0, 2), (1, 1), (1, 2)])          # edge squares
+            tuples.append([(1, 1), (1, 2), (2, 1), (2, 2)])          # centre square
+            return tuples
+
         # Horizontal rows
         for i in range(self.board_size):
             tuples.append([(i, j) for j in range(self.board_size)])
@@ -35,75 +145,108 @@ class NTupleNetwork:
         
         return tuples
 
-    def _initialize_weights(self):
-        """Initializes weight tables for each N-tuple with empty dictionaries."""
-        return [{} for _ in self.tuples]
+    def _create_symmetries(self):
+        """Returns the 8 coordinate transforms (rotations and reflections) of the board."""
+        n = self.board_size - 1
+        return [
+            lambda r, c: (r, c),
+            lambda r, c: (c, n - r),
+            lambda r, c: (n - r, n - c),
+            lambda r, c: (n - c, r),
+            lambda r, c: (r, n - c),
+            lambda r, c: (c, r),
+            lambda r, c: (n - r, c),
+            lambda r, c: (n - c, n - r),
+        ]
 
-    def get_pattern_index(self, board, tuple_coords):
+    def _flatten_tuples(self):
         """
-        Calculates a unique index for a given pattern of tiles on the board.
-
-        This works by converting the sequence of tile powers in a tuple to a
-        single integer, treating it as a number in a different base.
+        Packs the features into arrays for the compiled evaluator.
+        shifts[k, i] is the bit offset in the packed board of the i-th cell
+        of feature k, precomputed so the kernels never unpack (row, col), and
+        table_ids[k] is the weight table it reads. Without symmetric sampling
+        every tuple is one feature with its own table.
         """
-        pattern = 0
-        for i, (row, col) in enumerate(tuple_coords):
-            tile_value = board[row][col]
-            power = int(math.log2(tile_value)) if tile_value > 0 else 0
-            pattern += power * (self.max_power ** i)
-        return pattern
+        symmetries = self._create_symmetries() if self.symmetric else [lambda r, c: (r, c)]
+        features = []
+        table_ids = []
+        for t_id, t_coords in enumerate(self.tuples):
+            for transform in symmetries:
+                features.append([transform(r, c) for r, c in t_coords])
+                table_ids.append(t_id)
 
-    def evaluate(self, board):
+        shifts = np.array([[4 * (r * BOARD_SIZE + c) for r, c in f_coords] for f_coords in features],
+                          dtype=np.int64)
+        return shifts, np.array(table_ids, dtype=np.int32)
+
+    def _initialize_weights(self):
         """
-        Evaluates the given board state by summing N-tuple weights and heuristics.
+        Initializes a dense, zeroed float32 weight table for each N-tuple,
+        indexed directly by pattern (16**4 entries = 256KB per tuple).
         """
-        total_value = 0.0
+        return np.zeros((len(self.tuples), MAX_POWER ** TUPLE_LEN), dtype=np.float32)
 
-        # 1. N-tuple learned weights
-        for t_id, t_coords in enumerate(self.tuples):
-            pattern = self.get_pattern_index(board, t_coords)
-            total_value += self.weights[t_id].get(pattern, 0.0)
+    def weights_from_tables(self, tables):
+        """
+        Converts legacy weights (one dictionary per tuple mapping
+        pattern -> weight) into the dense weight array.
+        """
+        weights = self._initialize_weights()
+        for t_id, table in enumerate(tables):
+            if table:
+                patterns = np.fromiter(table.keys(), dtype=np.int64, count=len(table))
+                values = np.fromiter(table.values(), dtype=np.float32, count=len(table))
+                weights[t_id, patterns] = values
+        return weights
 
-        # 2. Empty cells are valuable
-        empty_cells = sum(row.count(0) for row in board)
-        total_value += empty_cells * 50
+    def save_weights(self, path):
+        """Saves the weights and the tuple layout to an uncompressed .npz file."""
+        np.savez(path, weights=self.weights, symmetric=self.symmetric)
 
-        # 3. Monotonicity (encourages ordered rows/columns)
-        monotonicity_score = 0
-        for i in range(self.board_size):
-            row_tiles = [value for value in board[i] if value > 0]
-            if len(row_tiles) > 1:
-                # Check if tiles are sorted in increasing/decreasing order
-                is_increasing = all(row_tiles[j] <= row_tiles[j+1] for j in range(len(row_tiles) - 1))
-                is_decreasing = all(row_tiles[j] >= row_tiles[j+1] for j in range(len(row_tiles) - 1))
-
-                if is_increasing or is_decreasing:
-                    monotonicity_score += 50
+    def load_weights(self, path):
+        """
+        Loads weights saved by save_weights (.npz), switching the network to
+        the tuple layout they were trained with.
 
-            # Get a list of only the non-zero tiles in the column
-            column = [board[j][i] for j in range(self.board_size)]
-            col_tiles = [value for value in column if value > 0]
+        Pickled checkpoints are still read: older ones stored one dictionary
+        per tuple mapping pattern -> weight, which is expanded into dense
+        tables. Their layout is inferred from the number of tables.
+        """
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                weights = data['weights']
+                symmetric = bool(data['symmetric'])
+            if symmetric != self.symmetric:
+                self._set_layout(symmetric)
+        else:
+            with open(path, 'rb') as f:
+                weights = pickle.load(f)
 
-            if len(col_tiles) > 1:
-                # Check for increasing/decreasing order
-                is_increasing = all(col_tiles[j] <= col_tiles[j+1] for j in range(len(col_tiles) - 1))
-                is_decreasing = all(col_tiles[j] >= col_tiles[j+1] for j in range(len(col_tiles) - 1))
+            if isinstance(weights, list):
+                if self.symmetric:
+                    self._set_layout(False)
+                weights = self.weights_from_tables(weights)
 
-                if is_increasing or is_decreasing:
-                    monotonicity_score += 50
+            if len(weights) != len(self.tuples):
+                self._set_layout(not self.symmetric)
 
-        total_value += monotonicity_score
+        if weights.shape != self.weights.shape:
+            raise ValueError(f"Expected weights of shape {self.weights.shape}, got {weights.shape}.")
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)
 
-        # 4. High tiles in corners are good
-        corners = [(0, 0), (0, self.board_size-1), (self.board_size-1, 0), (self.board_size-1, self.board_size-1)]
-        highest_tile = max(max(row) for row in board)
-        if highest_tile >= 64:
-            for r, c in corners:
-                if board[r][c] == highest_tile:
-                    total_value += highest_tile
-                    break # Only reward one corner
+    def evaluate(self, board):
+        """
+        Evaluates the given packed board by summing N-tuple weights and heuristics.
+        """
+        return evaluate_packed(np.uint64(board), self.shifts, self.table_ids, self.weights)
 
-        return total_value
+    def evaluate_batch(self, boards):
+        """
+        Evaluates a sequence of packed boards (e.g. the candidate afterstates
+        of one decision) and returns their values as an array.
+        """
+        boards = np.asarray(boards, dtype=np.uint64)
+        return _evaluate_batch(boards, self.shifts, self.table_ids, self.weights)
 
 
 class NTupleSolver:
@@ -121,20 +264,19 @@ class NTupleSolver:
         if self.game.game_over:
             return None
 
-        best_move = None
-        best_value = float('-inf')
-
-        for move in ["up", "down", "left", "right"]:
-            game_copy = copy.deepcopy(self.game)
-            if game_copy.make_move(move):
-                # The state after the move but before a new tile is added
-                # is often called the "afterstate".
-                value = self.network.evaluate(game_copy.board)
-                if value > best_value:
-                    best_value = value
-                    best_move = move
-        
-        return best_move
+        # The state after the move but before a new tile is added
+        # is often called the "afterstate".
+        board = np.uint64(self.game.board)
+        afterstates = np.array([move_board(board, d)[0] for d in range(len(DIRECTIONS))], dtype=np.uint64)
+        changed = afterstates != board
+        if not changed.any():
+            return None
+
+        # Score all four afterstates in one call; moves that change nothing
+        # can never be picked.
+        values = self.network.evaluate_batch(afterstates)
+        values[~changed] = -np.inf
+        return DIRECTIONS[int(np.argmax(values))]
 
     def make_move(self):
         """Finds and executes the best move on the game board."""
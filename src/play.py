@@ -1,5 +1,4 @@
 import pygame
-import pickle
 import argparse
 import os
 
@@ -57,10 +56,9 @@ class GameGUI:
         self.running = True
 
     def load_weights(self, path):
-        """Loads weights from a pickle file into the network."""
+        """Loads weights from a .npz (or legacy pickle) file into the network."""
         try:
-            with open(path, 'rb') as f:
-                self.network.weights = pickle.load(f)
+            self.network.load_weights(path)
             print(f"Successfully loaded weights from: {path}")
         except FileNotFoundError:
             print(f"Warning: Weights file not found at '{path}'. AI will play with untrained heuristics.")
@@ -93,7 +91,7 @@ class GameGUI:
         
         for r in range(self.game.board_size):
             for c in range(self.game.board_size):
-                self.draw_tile(r, c, self.game.board[r][c])
+                self.draw_tile(r, c, self.game.get_tile(r, c))
 
     def draw_ui(self):
         """Draws static UI elements like title, score, and instructions."""
@@ -1,12 +1,76 @@
-import pickle
 import time
-import copy
 import argparse
 import os
 import glob
 
-from game2048 import Game2048
-from ntuple_network import NTupleNetwork
+import numpy as np
+from numba import njit
+
+from game2048 import DIRECTIONS, Game2048, TilePool, count_empty, max_exponent, move_board
+from ntuple_network import NTupleNetwork, evaluate_packed, pattern_index
+
+@njit(cache=True)
+def get_reward(prev_score, current_score, prev_board, current_board):
+    """
+    Calculates a reward based on the change in game state.
+    A good reward function is critical for effective training.
+    """
+    # 1. Reward for increasing the score (primary goal)
+    score_reward = current_score - prev_score
+
+    # 2. Bonus for creating a new highest tile
+    prev_max_power = max_exponent(prev_board)
+    current_max_power = max_exponent(current_board)
+    tile_reward = 1 << current_max_power if current_max_power > prev_max_power else 0
+
+    # 3. Small bonus for keeping more cells empty
+    empty_reward = count_empty(current_board) * 10
+
+    return score_reward + tile_reward + empty_reward
+
+
+@njit(cache=True)
+def td_step(board, score, prev_afterstate, prev_value, has_prev,
+            shifts, table_ids, weights, alpha, gamma):
+    """
+    Runs one compiled step of the training loop: picks the greedy move from
+    `board` and applies the TD update to the previous afterstate's weights.
+
+    Returns (direction, afterstate, value); direction is an index into
+    DIRECTIONS, or -1 if no move changes the board.
+    """
+    # --- Step 1: Find the best move and its state
+    best_direction = -1
+    best_afterstate = board
+    best_value = -np.inf
+    for direction in range(4):
+        # "Afterstate" is the board after a move but before a new tile is added
+        afterstate, _ = move_board(board, direction)
+        if afterstate != board:
+            value = evaluate_packed(afterstate, shifts, table_ids, weights)
+            if value > best_value:
+                best_value = value
+                best_direction = direction
+                best_afterstate = afterstate
+
+    if best_direction < 0:
+        return best_direction, best_afterstate, best_value
+
+    # Calculate reward and perform TD Update
+    if has_prev:
+        reward = get_reward(score, score, prev_afterstate, best_afterstate)
+
+        # The difference between our new estimate and the old one
+        td_error = reward + (gamma * best_value) - prev_value
+
+        # With symmetric sampling several features share a table,
+        # so each table receives one update per symmetric view.
+        for k in range(shifts.shape[0]):
+            pattern = pattern_index(prev_afterstate, shifts[k])
+            weights[table_ids[k], pattern] += alpha * td_error
+
+    return best_direction, best_afterstate, best_value
+
 
 class TDLearner:
     """
@@ -15,32 +79,14 @@ class TDLearner:
     The learner plays games of 2048, and for each move, it updates the network's
     weights based on the reward received and the value of the state.
     """
-    def __init__(self, network, alpha=0.01, gamma=0.95):
+    def __init__(self, network, alpha=0.01, gamma=0.95, seed=None):
 
-        self.game = Game2048()
+        # Tile spawns come from a seeded, batch-generated pool
+        self.game = Game2048(tile_pool=TilePool(seed=seed))
         self.network = network
         self.alpha = alpha
         self.gamma = gamma
 
-    def get_reward(self, prev_score, current_score, prev_board, current_board):
-        """
-        Calculates a reward based on the change in game state.
-        A good reward function is critical for effective training.
-        """
-        # 1. Reward for increasing the score (primary goal)
-        score_reward = current_score - prev_score
-
-        # 2. Bonus for creating a new highest tile
-        prev_max_tile = max(max(row) for row in prev_board)
-        current_max_tile = max(max(row) for row in current_board)
-        tile_reward = current_max_tile if current_max_tile > prev_max_tile else 0
-        
-        # 3. Small bonus for keeping more cells empty
-        empty_cells = sum(row.count(0) for row in current_board)
-        empty_reward = empty_cells * 10
-
-        return score_reward + tile_reward + empty_reward
-
     def train(self, num_episodes, save_interval, weights_dir):
         """
         Runs the main training loop for a certain number of episodes.
@@ -49,82 +95,70 @@ class TDLearner:
         start_time = time.time()
         best_tile = 0
         
+        # Under symmetric sampling every table is updated once per view;
+        # split the step between the views so training stays stable.
+        alpha = self.alpha / self.network.num_views
+
         for episode in range(1, num_episodes + 1):
             self.game.reset()
-            prev_afterstate = None
-            prev_value = 0
+            prev_afterstate = 0
+            prev_value = 0.0
+            has_prev = False
 
             while not self.game.game_over:
-                # --- Step 1: Find the best move and its state
-                best_move = None
-                best_afterstate = None
-                best_value = float('-inf')
-
-                for move in ["up", "down", "left", "right"]:
-                    game_copy = copy.deepcopy(self.game)
-                    if game_copy.make_move(move):
-                        # "Afterstate" is the board after a move but before a new tile is added
-                        afterstate = game_copy.board
-                        value = self.network.evaluate(afterstate)
-                        
-                        if value > best_value:
-                            best_value = value
-                            best_move = move
-                            best_afterstate = afterstate
-
-                if best_move is None:
-                    break 
-
-                # Calculate reward and perform TD Update
-                if prev_afterstate is not None:
-                    
-                    reward = self.get_reward(
-                        self.game.score, self.game.score,
-                        prev_afterstate, best_afterstate
-                    )
-                    
-                    # The difference between our new estimate and the old one
-                    td_error = reward + (self.gamma * best_value) - prev_value
-                    
-                    
-                    for t_id, t_coords in enumerate(self.network.tuples):
-                        pattern = self.network.get_pattern_index(prev_afterstate, t_coords)
-                        current_weight = self.network.weights[t_id].get(pattern, 0.0)
-                        self.network.weights[t_id][pattern] = current_weight + self.alpha * td_error
-                
+                direction, afterstate, value = td_step(
+                    np.uint64(self.game.board), self.game.score, np.uint64(prev_afterstate), prev_value, has_prev,
+                    self.network.shifts, self.network.table_ids, self.network.weights,
+                    alpha, self.gamma
+                )
+                if direction < 0:
+                    break
+
                 # Make the best move and update the game state
-                self.game.make_move(best_move)
-                prev_afterstate = best_afterstate
-                prev_value = best_value
+                self.game.make_move(DIRECTIONS[direction])
+                prev_afterstate = afterstate
+                prev_value = value
+                has_prev = True
 
             # Log progress and save weights
-            current_max_tile = max(max(row) for row in self.game.board)
+            current_max_tile = 1 << max_exponent(self.game.board)
             if current_max_tile > best_tile:
                 best_tile = current_max_tile
                 print(f"  New best tile: {best_tile} at episode {episode}")
 
             if episode % save_interval == 0:
-                self._save_weights(f"{weights_dir}/ntuple_weights_{episode}.pkl")
+                self._save_weights(f"{weights_dir}/ntuple_weights_{episode}.npz")
                 elapsed = time.time() - start_time
                 print(f"Episode {episode}/{num_episodes} | Time: {elapsed:.1f}s | "
                       f"Score: {self.game.score} | Highest Tile: {current_max_tile}")
         
         # Save the final weights after all trianing episodes
-        self._save_weights(f"{weights_dir}/ntuple_weights_final.pkl")
+        self._save_weights(f"{weights_dir}/ntuple_weights_final.npz")
         print(f"\nTraining complete in {time.time() - start_time:.1f} seconds.")
         print(f"Best tile achieved during training: {best_tile}")
 
     def _save_weights(self, filename):
         """Saves the network weights to a file."""
         os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, 'wb') as f:
-            pickle.dump(self.network.weights, f)
+        self.network.save_weights(filename)
         print(f"Weights saved to {filename}")
 
-def find_latest_checkpoint(weights_dir):
-    """Finds the most recent weight checkpoint file."""
+def checkpoint_is_symmetric(path):
+    """
+    Reads the tuple layout of a checkpoint without loading its weights.
+    Pickled checkpoints are taken to be non-symmetric, like the shipped ones.
+    """
+    if not path.endswith('.npz'):
+        return False
+    with np.load(path) as data:
+        return bool(data['symmetric'])
+
+def find_latest_checkpoint(weights_dir, symmetric=False):
+    """Finds the most recent weight checkpoint file with the given layout."""
     
-    checkpoints = glob.glob(f"{weights_dir}/*.pkl")
+    # Legacy .pkl checkpoints can still be resumed from
+    checkpoints = glob.glob(f"{weights_dir}/*.npz") + glob.glob(f"{weights_dir}/*.pkl")
+    checkpoints = [cp for cp in checkpoints if checkpoint_is_symmetric(cp) == symmetric]
     if not checkpoints:
         return None, 0
 
@@ -144,19 +178,33 @@ def find_latest_checkpoint(weights_dir):
     
     return latest_checkpoint, latest_episode
 
+def convert_legacy_checkpoints(weights_dir):
+    """Writes a .npz copy of every pickled checkpoint in weights_dir."""
+    for path in sorted(glob.glob(f"{weights_dir}/*.pkl")):
+        network = NTupleNetwork()
+        network.load_weights(path)
+        network.save_weights(os.path.splitext(path)[0] + ".npz")
+        print(f"Converted {path}")
+
 def run_training(args):
     """Sets up and runs the training session based on command-line arguments."""
-    network = NTupleNetwork()
+    network = NTupleNetwork(symmetric=args.symmetric)
     
 
-    latest_checkpoint, resume_episode = find_latest_checkpoint(args.weights_dir)
+    latest_checkpoint, resume_episode = find_latest_checkpoint(args.weights_dir, args.symmetric)
     if latest_checkpoint:
         print(f"Resuming training from checkpoint: {latest_checkpoint}")
-        with open(latest_checkpoint, 'rb') as f:
-            network.weights = pickle.load(f)
+        network.load_weights(latest_checkpoint)
         start_episode = resume_episode
+        # load_weights adopts the checkpoint's layout; don't let it override --symmetric
+        if network.symmetric != args.symmetric:
+            layout = "symmetric" if network.symmetric else "non-symmetric"
+            print(f"Checkpoint {latest_checkpoint} uses the {layout} layout, which does not "
+                  f"match --symmetric={args.symmetric}. Starting from fresh weights instead.")
+            network = NTupleNetwork(symmetric=args.symmetric)
+            start_episode = 0
     else:
-        print("No checkpoints found. Starting new training session.")
+        print("No checkpoints with a matching layout found. Starting new training session.")
         start_episode = 0
 
     print("Starting new training session.")
@@ -167,7 +215,7 @@ def run_training(args):
         print("Training already completed for the specified number of episodes.")
         return
 
-    trainer = TDLearner(network, alpha=args.alpha)
+    trainer = TDLearner(network, alpha=args.alpha, seed=args.seed)
     trainer.train(
         num_episodes=remaining_episodes, 
         save_interval=args.save_interval, 
@@ -180,7 +228,13 @@ if __name__ == "__main__":
     parser.add_argument('--save-interval', type=int, default=5000, help='Save weights every N episodes.')
     parser.add_argument('--alpha', type=float, default=0.01, help='Learning rate for the TD learner.')
     parser.add_argument('--weights-dir', type=str, default='weights', help='Directory to save/load weight files.')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for the tile spawns, for reproducible runs.')
+    parser.add_argument('--symmetric', action='store_true', help='Share weight tables across the 8 board symmetries.')
+    parser.add_argument('--convert-legacy', action='store_true', help='Convert the .pkl checkpoints in --weights-dir to .npz and exit.')
     
     
     args = parser.parse_args()
-    run_training(args)
+    if args.convert_legacy:
+        convert_legacy_checkpoints(args.weights_dir)
+    else:
+        run_training(args)